@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import httpx
 from sqlalchemy.orm import Session
@@ -28,6 +28,12 @@ router = APIRouter()
 logger = logging.getLogger(__name__)
 security = HTTPBearer()
 
+
+def get_grok_service(request: Request) -> GrokService:
+    """Build a GrokService bound to the app's shared Grok client"""
+    return GrokService(request.app.state.grok_client)
+
+
 @router.get("/test")
 async def test_newsletter():
     """Test endpoint for newsletter API"""
@@ -46,10 +52,9 @@ async def debug_auth(
     }
 
 @router.get("/test-generate")
-async def test_generate_newsletter():
+async def test_generate_newsletter(grok_service: GrokService = Depends(get_grok_service)):
     """Test newsletter generation without authentication"""
     try:
-        grok_service = GrokService()
         
         result = await grok_service.generate_newsletter(
             topic="AI Trends in 2024",
@@ -208,11 +213,11 @@ async def get_current_user(
 async def generate_newsletter(
     request: NewsletterGenerateRequest,
     current_user: Dict[str, Any] = Depends(get_current_user),
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    grok_service: GrokService = Depends(get_grok_service)
 ):
     """Generate a new AI-powered newsletter using Grok"""
     try:
-        grok_service = GrokService()
         
         # Get user preferences for personalized content (temporarily disabled)
         user_preferences = None
@@ -445,11 +450,11 @@ async def generate_newsletter(
 async def generate_newsletter_variations(
     topic: str = Query(..., description="Newsletter topic"),
     num_variations: int = Query(3, ge=1, le=5, description="Number of variations to generate"),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    grok_service: GrokService = Depends(get_grok_service)
 ):
     """Generate multiple variations of a newsletter for A/B testing"""
     try:
-        grok_service = GrokService()
         
         variations = await grok_service.generate_newsletter_variations(
             topic=topic,
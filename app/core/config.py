@@ -41,26 +41,12 @@ class Settings(BaseSettings):
     @property
     def effective_grok_api_key(self) -> Optional[str]:
         """Get the effective Grok API key, checking both GROK_API_KEY and GROQ_API_KEY"""
-        api_key = self.GROK_API_KEY or self.GROQ_API_KEY
-        if api_key:
-            print(f"[OK] Grok API Key loaded: {api_key[:10]}...{api_key[-4:] if len(api_key) > 14 else '...'}")
-        else:
-            print("[ERROR] No Grok API Key found in environment variables")
-            print(f"   GROK_API_KEY: {self.GROK_API_KEY}")
-            print(f"   GROQ_API_KEY: {self.GROQ_API_KEY}")
-        return api_key
+        return self.GROK_API_KEY or self.GROQ_API_KEY
     
     @property
     def effective_grok_api_url(self) -> str:
         """Get the effective Grok API URL, checking both GROK_API_URL and GROQ_API_URL"""
-        api_url = self.GROK_API_URL or self.GROQ_API_URL
-        if api_url:
-            print(f"[OK] Grok API URL loaded: {api_url}")
-        else:
-            print("[ERROR] No Grok API URL found in environment variables")
-            print(f"   GROK_API_URL: {self.GROK_API_URL}")
-            print(f"   GROQ_API_URL: {self.GROQ_API_URL}")
-        return api_url
+        return self.GROK_API_URL or self.GROQ_API_URL
     
     # Email Configuration
     RESEND_API_KEY: Optional[str] = None
@@ -78,6 +64,21 @@ class Settings(BaseSettings):
     GROQ_API_KEY: Optional[str] = None  # Alternative naming
     GROK_API_URL: str = "https://api.groq.com/openai/v1/chat/completions"
     GROQ_API_URL: Optional[str] = None  # Alternative naming
+    GROK_CACHE_TTL: int = 3600  # seconds; 0 disables the newsletter response cache
+    GROK_CACHE_MAX_ENTRIES: int = 1024
+    GROK_JSON_MODE: bool = True  # request a JSON object; Groq only supports this unstreamed
+    # Client-side throttling; defaults follow Groq's published llama-3.3-70b limits (0 disables a bucket)
+    GROK_MAX_CONCURRENCY: int = 8
+    GROK_REQUESTS_PER_MINUTE: int = 30
+    GROK_TOKENS_PER_MINUTE: int = 12000
+    GROK_MAX_QUEUE_WAIT: float = 30.0  # seconds a call may wait for RPM/TPM budget before failing
+    GROK_MAX_CONNECTIONS: int = 1000
+    GROK_MAX_KEEPALIVE_CONNECTIONS: int = 100
+    
+    # RSS Ingestion
+    RSS_FETCH_CONCURRENCY: int = 20  # sources fetched at once by fetch_all_sources
+    RSS_PROCESS_WORKERS: int = 0  # article analysis worker processes; 0 uses one per CPU
+    RSS_PROCESS_CONCURRENCY: int = 0  # articles of one feed processed at once; 0 uses two per worker
     
     # Rate Limiting
     RATE_LIMIT_REQUESTS: int = 100
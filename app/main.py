@@ -1,6 +1,7 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 from app.core.config import settings
 from app.api.supabase_auth import router as supabase_auth_router
 from app.api.profile_picture import router as profile_picture_router
@@ -14,18 +15,35 @@ from app.models.user_preferences import UserPreferences
 from app.models.newsletter import Newsletter
 from app.models.rss_source import RSSSource
 from app.models.article import Article
+from app.services.grok_service import get_grok_client, close_grok_client
+from app.services.rss_service import shutdown_cpu_pool
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the pooled Grok client for the app's lifetime and stop worker pools on exit"""
+    app.state.grok_client = get_grok_client()
+    try:
+        yield
+    finally:
+        await close_grok_client()
+        shutdown_cpu_pool()
+
+
 # Create FastAPI application
 app = FastAPI(
     title=settings.APP_NAME,
     version=settings.APP_VERSION,
     description="AI-powered newsletter creation platform - AI-Newz",
-    debug=settings.DEBUG
+    debug=settings.DEBUG,
+    lifespan=lifespan,
+    # orjson serializes large article/stats payloads several times faster than the stdlib encoder
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -93,14 +111,14 @@ async def debug_env():
 
 
 @app.post("/api/v1/test-newsletter-generate")
-async def test_newsletter_generate(request: dict):
+async def test_newsletter_generate(request: dict, http_request: Request):
     """Test newsletter generation without authentication - for development"""
     try:
         from app.services.grok_service import GrokService
         from app.services.supabase_rss_service import SupabaseRSSService
         import httpx
         
-        grok_service = GrokService()
+        grok_service = GrokService(http_request.app.state.grok_client)
 
         # Normalize incoming params from frontend (camelCase) and backend (snake_case)
         def pick(key_snake: str, key_camel: str, default=None):
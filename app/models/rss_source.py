@@ -18,6 +18,9 @@ class RSSSource(Base):
     credibility_score = Column(Float, default=0.0)  # 0.0 to 1.0
     last_fetched = Column(DateTime(timezone=True), nullable=True)
     fetch_frequency = Column(Integer, default=3600)  # seconds between fetches
+    etag = Column(String(255), nullable=True)  # ETag of the last fetched feed, for conditional GETs
+    last_modified = Column(String(64), nullable=True)  # Last-Modified of the last fetched feed
+    last_content_hash = Column(String(32), nullable=True)  # blake2b-128 hex digest of the last fetched feed body
     
     # Visual branding
     logo_url = Column(String(1000), nullable=True)  # Source logo
@@ -1,6 +1,7 @@
 import httpx
 import json
 import logging
+import re
 from typing import Dict, List, Optional, Any
 from app.core.config import settings
 
@@ -264,32 +265,31 @@ Make sure the newsletter is engaging, informative, and provides real value to re
             
         except Exception as e:
             logger.warning(f"Structured parsing failed: {e}")
-                # Fallback: create a basic structure
-                newsletter_data = {
-                    "subject": f"Weekly Update: {topic}",
-                    "topic": topic,  # Use original topic as fallback
-                    "opening": content[:200] + "..." if len(content) > 200 else content,
-                    "sections": [
-                        {
-                            "title": "Main Content",
-                            "content": content,
-                            "type": "main"
-                        }
-                    ],
-                    "call_to_action": "Stay tuned for more updates!",
-                    "estimated_read_time": "5 minutes",
-                    "tags": [topic.lower().replace(" ", "-")]
-                }
-                
-                # Add articles if available
-                if curated_articles:
-                    newsletter_data["articles"] = curated_articles
-                
-                return newsletter_data
+            # Fallback: create a basic structure
+            newsletter_data = {
+                "subject": f"Weekly Update: {topic}",
+                "topic": topic,  # Use original topic as fallback
+                "opening": content[:200] + "..." if len(content) > 200 else content,
+                "sections": [
+                    {
+                        "title": "Main Content",
+                        "content": content,
+                        "type": "main"
+                    }
+                ],
+                "call_to_action": "Stay tuned for more updates!",
+                "estimated_read_time": "5 minutes",
+                "tags": [topic.lower().replace(" ", "-")]
+            }
+            
+            # Add articles if available
+            if curated_articles:
+                newsletter_data["articles"] = curated_articles
             
+            return newsletter_data
+    
     def _parse_structured_response(self, content: str) -> Dict[str, Any]:
         """Parse structured text response into newsletter data"""
-            import re
         
         # Initialize the newsletter data structure
         newsletter_data = {
@@ -399,6 +399,14 @@ Make sure the newsletter is engaging, informative, and provides real value to re
             newsletter_data["call_to_action"] = "Stay tuned for more updates!"
         
         return newsletter_data
+    
+    def _parse_json_response(self, content: str, topic: str, curated_articles: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Parse a JSON-formatted Grok response, repairing common formatting issues"""
+        try:
+            # Extract the JSON object from the response
+            json_start = content.find('{')
+            json_end = content.rfind('}') + 1
+            cleaned_json = content[json_start:json_end] if json_start != -1 and json_end > json_start else content
             
             # Remove control characters that can break JSON parsing
             import unicodedata
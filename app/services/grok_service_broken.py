@@ -1,6 +1,7 @@
 import httpx
 import json
 import logging
+import re
 from typing import Dict, List, Optional, Any
 from app.core.config import settings
 
@@ -257,31 +258,30 @@ Make sure the newsletter is engaging, informative, and provides real value to re
             logger.warning(f"Structured parsing failed: {e}")
             # Fallback: create a basic structure
             newsletter_data = {
-                    "subject": f"Weekly Update: {topic}",
-                    "topic": topic,  # Use original topic as fallback
-                    "opening": content[:200] + "..." if len(content) > 200 else content,
-                    "sections": [
-                        {
-                            "title": "Main Content",
-                            "content": content,
-                            "type": "main"
-                        }
-                    ],
-                    "call_to_action": "Stay tuned for more updates!",
-                    "estimated_read_time": "5 minutes",
-                    "tags": [topic.lower().replace(" ", "-")]
-                }
-                
-                # Add articles if available
-                if curated_articles:
-                    newsletter_data["articles"] = curated_articles
-                
-                return newsletter_data
+                "subject": f"Weekly Update: {topic}",
+                "topic": topic,  # Use original topic as fallback
+                "opening": content[:200] + "..." if len(content) > 200 else content,
+                "sections": [
+                    {
+                        "title": "Main Content",
+                        "content": content,
+                        "type": "main"
+                    }
+                ],
+                "call_to_action": "Stay tuned for more updates!",
+                "estimated_read_time": "5 minutes",
+                "tags": [topic.lower().replace(" ", "-")]
+            }
+            
+            # Add articles if available
+            if curated_articles:
+                newsletter_data["articles"] = curated_articles
             
+            return newsletter_data
+    
     def _parse_structured_response(self, content: str) -> Dict[str, Any]:
         """Parse structured text response into newsletter data"""
-                import re
-                
+        
         # Initialize the newsletter data structure
         newsletter_data = {
             "subject": "",
@@ -1,15 +1,27 @@
+import ahocorasick
 import asyncio
+import hashlib
 import logging
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
 from typing import List, Dict, Any, Optional, Tuple
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import feedparser
 import httpx
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from selectolax.lexbor import LexborHTMLParser
 import textstat
+from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 from dateutil import parser as date_parser
 import re
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, desc, func
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import and_, or_, desc, func, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
 
 from app.models.rss_source import RSSSource
 from app.models.article import Article
@@ -19,24 +31,206 @@ from app.core.config import settings
 logger = logging.getLogger(__name__)
 
 
+# Filled in lazily per character, so the table only holds characters seen in article text.
+# _clean_text runs in the analysis workers, so each worker fills its own copy; that's bounded
+# by the distinct characters it sees and costs one isalnum/isspace check per new character.
+class _PunctuationFilter(dict):
+    """str.translate table for _clean_text: keeps word characters, whitespace and .,!?;:()-"""
+    
+    def __missing__(self, codepoint: int) -> Optional[int]:
+        char = chr(codepoint)
+        value = codepoint if char.isalnum() or char.isspace() or char in "_.,!?;:()-" else None
+        self[codepoint] = value
+        return value
+
+
+_PUNCTUATION_FILTER = _PunctuationFilter()
+
+# Category keywords in priority order; a category matches on a substring of the text or an exact tag
+_CATEGORY_KEYWORDS = (
+    ("technology", frozenset({"technology", "tech", "software", "ai", "artificial intelligence", "machine learning", "programming", "code", "app", "digital"})),
+    ("business", frozenset({"business", "finance", "economy", "market", "investment", "company", "corporate", "startup", "revenue", "profit"})),
+    ("science", frozenset({"science", "research", "study", "scientific", "discovery", "experiment", "data", "analysis"})),
+    ("health", frozenset({"health", "medical", "medicine", "healthcare", "disease", "treatment", "patient", "doctor", "hospital", "wellness"})),
+)
+
+# Aho-Corasick automaton over all category keywords, so one scan of the text finds every category present
+_CATEGORY_AUTOMATON = ahocorasick.Automaton()
+for _category, _keywords in _CATEGORY_KEYWORDS:
+    for _keyword in _keywords:
+        _CATEGORY_AUTOMATON.add_word(_keyword, _category)
+_CATEGORY_AUTOMATON.make_automaton()
+
+# Loading the VADER lexicon is the expensive part, so build the analyzer once per process
+_SENTIMENT_ANALYZER = SentimentIntensityAnalyzer()
+
+
+def _html_to_text(markup: str, separator: str = "", strip: bool = False) -> str:
+    """Extract text from HTML without building a BeautifulSoup tree (script/style bodies dropped)"""
+    tree = LexborHTMLParser(markup)
+    tree.strip_tags(["script", "style"])
+    return tree.text(separator=separator, strip=strip)
+
+
+# The image, metadata and content-type checks only look at these tags, so only they are built
+_IMAGE_TAGS = SoupStrainer("img")
+_CONTENT_TAGS = SoupStrainer(["img", "video", "iframe", "audio", "ul", "ol", "blockquote"])
+
+
+def _parse_html(markup: str, parse_only: Optional[SoupStrainer] = None) -> BeautifulSoup:
+    """Build a BeautifulSoup tree with the C-based lxml parser (parse_only: keep just those tags)"""
+    return BeautifulSoup(markup, "lxml", parse_only=parse_only)
+
+
+
+# INSERT constructs that can skip rows whose URL is already stored, by database dialect
+_UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+# Readability scores keyed by a digest of the raw article content, so re-ingested articles skip
+# textstat's syllable counting without the cache holding on to article bodies. It lives in the
+# parent process: the score is looked up before the article goes to the worker pool and stored
+# once it comes back, so a single cache serves every worker.
+_READABILITY_CACHE: "OrderedDict[bytes, float]" = OrderedDict()
+_READABILITY_CACHE_SIZE = 2048
+
+
+def _readability_key(content: str) -> bytes:
+    """Cache key for an article's readability score"""
+    return hashlib.blake2b(content.encode(), digest_size=16).digest()
+
+
+def _cached_readability(key: bytes) -> Optional[float]:
+    """Cached readability score for a key, if any"""
+    score = _READABILITY_CACHE.get(key)
+    if score is not None:
+        _READABILITY_CACHE.move_to_end(key)
+    return score
+
+
+def _cache_readability(key: bytes, score: float) -> None:
+    """Store a readability score, evicting the least recently used ones"""
+    _READABILITY_CACHE[key] = score
+    _READABILITY_CACHE.move_to_end(key)
+    if len(_READABILITY_CACHE) > _READABILITY_CACHE_SIZE:
+        _READABILITY_CACHE.popitem(last=False)
+
+
+@lru_cache(maxsize=4096)
+def _word_set(text: str) -> frozenset:
+    """Lowercased word set of a title; cached since each title is compared against many candidates"""
+    return frozenset(text.lower().split())
+
+
+# Worker processes for article text analysis, which is pure-Python CPU work that would
+# otherwise hold the GIL and stall feed fetching on the event loop
+_cpu_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _cpu_worker_count() -> int:
+    """Number of article analysis worker processes"""
+    return settings.RSS_PROCESS_WORKERS or os.cpu_count() or 1
+
+
+def get_cpu_pool() -> ProcessPoolExecutor:
+    """Return the process-wide article analysis pool, creating it on first use"""
+    global _cpu_pool
+    if _cpu_pool is None:
+        _cpu_pool = ProcessPoolExecutor(
+            max_workers=_cpu_worker_count(),
+            # The pool starts lazily, after the event loop and the httpx/SQLAlchemy threads
+            # exist; forking then can copy held locks into the child, so start workers fresh
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _cpu_pool
+
+
+async def _run_in_cpu_pool(func, *args):
+    """Run func(*args) in the analysis pool, replacing the pool if a dead worker broke it"""
+    loop = asyncio.get_running_loop()
+    pool = get_cpu_pool()
+    try:
+        return await loop.run_in_executor(pool, func, *args)
+    except BrokenProcessPool:
+        # A worker died (OOM on a huge article, a parser crash); the pool rejects all work
+        # from then on, so swap in a new one (once, even with many callers failing at once)
+        global _cpu_pool
+        if _cpu_pool is pool:
+            logger.warning("Article analysis pool broke (a worker died); starting a new one")
+            _cpu_pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+        return await loop.run_in_executor(get_cpu_pool(), func, *args)
+
+
+def shutdown_cpu_pool() -> None:
+    """Stop the article analysis workers (called on application shutdown)"""
+    global _cpu_pool
+    if _cpu_pool is not None:
+        _cpu_pool.shutdown(cancel_futures=True)
+        _cpu_pool = None
+
+
+def _analyze_article_text(
+    content: str, tags: List[str], readability_score: Optional[float] = None
+) -> Dict[str, Any]:
+    """Clean an article's text and compute its text metrics (runs in the worker pool; readability_score: cached)"""
+    # _clean_text strips the markup itself, so the HTML is parsed only once here
+    content = RSSService._clean_text(content)
+    
+    word_count = len(content.split())
+    if readability_score is None:
+        readability_score = textstat.flesch_reading_ease(content) if content else 0
+    return {
+        "content": content,
+        "word_count": word_count,
+        "readability_score": readability_score,
+        "sentiment_score": RSSService._calculate_sentiment(content),
+        "quality_score": RSSService._calculate_quality_score(content, word_count, readability_score),
+        # _extract_tags already lowercases the tags
+        "category": RSSService._categorize_content(content.lower(), tags)
+    }
+
+
 class RSSService:
     """Service for RSS feed parsing and content processing"""
     
     def __init__(self):
+        self.user_agent = "AI-Newz RSS Parser/1.0"
         self.session = httpx.AsyncClient(
-            timeout=30.0,
+            http2=True,  # Multiplex concurrent fetches to the same host over one connection
+            timeout=httpx.Timeout(30.0, connect=10.0),
             follow_redirects=True,  # Automatically follow redirects
-            max_redirects=10  # Allow up to 10 redirects
+            max_redirects=10,  # Allow up to 10 redirects
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=30.0),
+            headers={"User-Agent": self.user_agent}
         )
-        self.user_agent = "AI-Newz RSS Parser/1.0"
+        # Caps concurrent source fetches so large source lists don't open a connection per source
+        self._fetch_sem = asyncio.Semaphore(settings.RSS_FETCH_CONCURRENCY)
+        # DB calls run in worker threads; this keeps the shared Session used by one thread at a time
+        self._db_lock = asyncio.Lock()
+        # Cleared when the pg_trgm % operator is missing (migration_articles_title_trgm.sql not run)
+        self._use_trgm = True
     
-    async def fetch_rss_feed(self, url: str) -> Optional[Dict[str, Any]]:
-        """Fetch and parse RSS feed from URL"""
+    async def fetch_rss_feed(
+        self,
+        url: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        content_hash: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Fetch and parse RSS feed from URL, conditionally when validators from a previous fetch are given"""
         try:
-            headers = {"User-Agent": self.user_agent}
             logger.info(f"Fetching RSS feed: {url}")
             
+            headers = {}
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+            
             response = await self.session.get(url, headers=headers)
+            if response.status_code == 304:
+                logger.info(f"RSS feed not modified since last fetch: {url}")
+                return {"status": "not_modified"}
             response.raise_for_status()
             
             # Log if redirects were followed
@@ -44,8 +238,27 @@ class RSSService:
                 redirect_urls = [r.url for r in response.history]
                 logger.info(f"Followed redirects for {url}: {redirect_urls}")
             
-            # Parse RSS feed
-            feed = feedparser.parse(response.content)
+            # Servers without ETag/Last-Modified support often still return byte-identical feeds
+            body_hash = hashlib.blake2b(response.content, digest_size=16).hexdigest()
+            if body_hash == content_hash:
+                logger.info(f"RSS feed body unchanged since last fetch: {url}")
+                return {"status": "not_modified"}
+            
+            # Parse RSS feed in a worker thread. Relative-URI rewriting is skipped (image URLs are
+            # resolved against the article URL); HTML sanitizing stays on, since entry fields are
+            # stored and rendered as HTML by the frontend.
+            feed = await asyncio.to_thread(
+                feedparser.parse,
+                response.content,
+                resolve_relative_uris=False
+            )
+            # feedparser treats RSS titles as plain text and leaves any markup in them unsanitized;
+            # titles and authors are shown as text, so strip tags from them
+            for entry in feed.entries:
+                for field in ("title", "author"):
+                    value = entry.get(field)
+                    if value and "<" in value:
+                        entry[field] = _html_to_text(value).strip()
             
             if feed.bozo:
                 logger.warning(f"RSS feed parsing warnings for {url}: {feed.bozo_exception}")
@@ -58,6 +271,9 @@ class RSSService:
                 "description": feed.feed.get("description", ""),
                 "language": feed.feed.get("language", "en"),
                 "entries": feed.entries,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "content_hash": body_hash,
                 "status": "success"
             }
             
@@ -88,12 +304,16 @@ class RSSService:
             if not content or (isinstance(content, list) and len(content) == 0):
                 content = article_data.get("summary", "")
             else:
-                # Extract text from HTML content
-                soup = BeautifulSoup(str(content), "html.parser")
-                content = soup.get_text()
+                content = str(content)
             
-            # Clean and process content
-            content = self._clean_text(content)
+            # Clean the content and calculate text metrics in the worker pool
+            tags = self._extract_tags(article_data)
+            readability_key = _readability_key(content)
+            metrics = await _run_in_cpu_pool(
+                _analyze_article_text, content, tags, _cached_readability(readability_key)
+            )
+            _cache_readability(readability_key, metrics["readability_score"])
+            content = metrics["content"]
 
             # Decode entities and strip HTML in summary/description
             if isinstance(article_data.get("summary"), str):
@@ -102,8 +322,7 @@ class RSSService:
                 unescaped = html.unescape(raw_summary)
                 # Then strip any HTML tags to plain text
                 try:
-                    soup_sum = BeautifulSoup(unescaped, "html.parser")
-                    cleaned_summary = soup_sum.get_text(separator=" ", strip=True)
+                    cleaned_summary = _html_to_text(unescaped, separator=" ", strip=True)
                 except Exception:
                     cleaned_summary = unescaped
                 article_data["summary"] = cleaned_summary
@@ -116,22 +335,18 @@ class RSSService:
                 # Fallback to summary if no content
                 original_content = article_data.get("summary", "")
             
+            # Parse the content once and share the tree between the image, metadata and type checks
+            soup = _parse_html(original_content, _CONTENT_TAGS) if original_content else None
+            
             # Get article URL for image extraction
             article_url = article_data.get("url", "")
             rss_images = article_data.get("rss_images", {})
-            image_data = await self.extract_images_from_content(original_content, article_url, rss_images)
-            content_metadata = self.extract_content_metadata(original_content)
-            content_type = self.detect_content_type(original_content, article_data.get("title", ""))
-            
-            # Calculate metrics
-            word_count = len(content.split())
-            readability_score = textstat.flesch_reading_ease(content) if content else 0
-            sentiment_score = self._calculate_sentiment(content)
-            quality_score = self._calculate_quality_score(content, word_count, readability_score)
-            
-            # Extract tags and category
-            tags = self._extract_tags(article_data)
-            category = self._categorize_content(content, tags)
+            image_data = await self.extract_images_from_content(original_content, article_url, rss_images, soup=soup)
+            # The worker already counted the words of the cleaned text; don't parse the markup a third time
+            content_metadata = self.extract_content_metadata(
+                original_content, soup=soup, word_count=metrics["word_count"]
+            )
+            content_type = self.detect_content_type(original_content, article_data.get("title", ""), soup=soup)
             
             # Override has_images if RSS images are found
             has_images = content_metadata["has_images"]
@@ -140,12 +355,12 @@ class RSSService:
             
             return {
                 "content": content,
-                "word_count": word_count,
-                "readability_score": readability_score,
-                "sentiment_score": sentiment_score,
-                "quality_score": quality_score,
+                "word_count": metrics["word_count"],
+                "readability_score": metrics["readability_score"],
+                "sentiment_score": metrics["sentiment_score"],
+                "quality_score": metrics["quality_score"],
                 "tags": tags,
-                "category": category,
+                "category": metrics["category"],
                 # New visual and metadata fields
                 "image_url": image_data["image_url"],
                 "thumbnail_url": image_data["thumbnail_url"],
@@ -180,44 +395,34 @@ class RSSService:
                 "content_type": "article"
             }
     
-    def _clean_text(self, text: str) -> str:
+    @staticmethod
+    def _clean_text(text: str) -> str:
         """Clean and normalize text content"""
         if not text:
             return ""
         
         # Remove HTML tags
-        soup = BeautifulSoup(text, "html.parser")
-        text = soup.get_text()
+        text = _html_to_text(text)
         
         # Remove extra whitespace
-        text = re.sub(r'\s+', ' ', text)
+        text = " ".join(text.split())
         
         # Remove special characters but keep basic punctuation
-        text = re.sub(r'[^\w\s.,!?;:()\-]', '', text)
+        text = text.translate(_PUNCTUATION_FILTER)
         
         return text.strip()
     
-    def _calculate_sentiment(self, text: str) -> float:
+    @staticmethod
+    def _calculate_sentiment(text: str) -> float:
         """Calculate sentiment score (-1.0 to 1.0)"""
         if not text:
             return 0.0
         
-        # Simple sentiment analysis based on word patterns
-        positive_words = ["good", "great", "excellent", "amazing", "wonderful", "fantastic", "positive", "success", "win", "best"]
-        negative_words = ["bad", "terrible", "awful", "horrible", "negative", "fail", "lose", "worst", "problem", "issue"]
-        
-        words = text.lower().split()
-        positive_count = sum(1 for word in words if word in positive_words)
-        negative_count = sum(1 for word in words if word in negative_words)
-        
-        total_words = len(words)
-        if total_words == 0:
-            return 0.0
-        
-        sentiment = (positive_count - negative_count) / total_words
-        return max(-1.0, min(1.0, sentiment))
+        # VADER compound score is already normalized to [-1, 1]
+        return _SENTIMENT_ANALYZER.polarity_scores(text)["compound"]
     
-    def _calculate_quality_score(self, content: str, word_count: int, readability_score: float) -> float:
+    @staticmethod
+    def _calculate_quality_score(content: str, word_count: int, readability_score: float) -> float:
         """Calculate overall quality score (0.0 to 1.0)"""
         if not content or word_count == 0:
             return 0.0
@@ -256,116 +461,205 @@ class RSSService:
                 elif isinstance(category, str):
                     tags.append(category.lower())
         
-        # Remove duplicates and limit
-        return list(set(tags))[:10]
+        # Remove duplicates (keeping feed order) and limit
+        return list(dict.fromkeys(tags))[:10]
     
-    def _categorize_content(self, content: str, tags: List[str]) -> str:
-        """Categorize content based on text and tags"""
-        content_lower = content.lower()
-        tags_lower = [tag.lower() for tag in tags]
-        
-        # Technology keywords
-        tech_keywords = ["technology", "tech", "software", "ai", "artificial intelligence", "machine learning", "programming", "code", "app", "digital"]
-        if any(keyword in content_lower or keyword in tags_lower for keyword in tech_keywords):
-            return "technology"
-        
-        # Business keywords
-        business_keywords = ["business", "finance", "economy", "market", "investment", "company", "corporate", "startup", "revenue", "profit"]
-        if any(keyword in content_lower or keyword in tags_lower for keyword in business_keywords):
-            return "business"
-        
-        # Science keywords
-        science_keywords = ["science", "research", "study", "scientific", "discovery", "experiment", "data", "analysis", "study", "research"]
-        if any(keyword in content_lower or keyword in tags_lower for keyword in science_keywords):
-            return "science"
-        
-        # Health keywords
-        health_keywords = ["health", "medical", "medicine", "healthcare", "disease", "treatment", "patient", "doctor", "hospital", "wellness"]
-        if any(keyword in content_lower or keyword in tags_lower for keyword in health_keywords):
-            return "health"
+    @staticmethod
+    def _categorize_content(content_lower: str, tags_lower: List[str]) -> str:
+        """Categorize content based on text and tags (both already lowercased)"""
+        found = {category for _, category in _CATEGORY_AUTOMATON.iter(content_lower)}
+        for category, keywords in _CATEGORY_KEYWORDS:
+            if category in found or not keywords.isdisjoint(tags_lower):
+                return category
         
         return "general"
     
     async def detect_duplicates(self, db: Session, article_url: str, title: str, content: str) -> Optional[int]:
         """Detect if article is a duplicate"""
+        async with self._db_lock:
+            return await asyncio.to_thread(self._find_duplicate, db, article_url, title)
+    
+    def _find_duplicate(self, db: Session, article_url: str, title: str) -> Optional[int]:
+        """Blocking lookups behind detect_duplicates"""
         try:
             # Check for exact URL match
             existing = db.query(Article).filter(Article.url == article_url).first()
             if existing:
                 return existing.id
             
-            # Check for similar titles (simple similarity)
-            similar_articles = db.query(Article).filter(
-                and_(
-                    Article.title.ilike(f"%{title[:50]}%"),
-                    Article.is_active == True
-                )
-            ).all()
+            # Check for similar titles: candidates from the trigram index, confirmed by word overlap
+            similar_articles = self._similar_title_rows(db, [title])
             
-            for article in similar_articles:
+            for article_id, other_title in similar_articles:
                 # Simple similarity check
-                if self._calculate_similarity(title, article.title) > 0.8:
-                    return article.id
+                if self._calculate_similarity(title, other_title) > 0.8:
+                    return article_id
             
             return None
             
         except Exception as e:
             logger.error(f"Error detecting duplicates: {str(e)}")
+            # A failed query aborts the transaction; later commits on this Session would fail too
+            db.rollback()
             return None
     
+    def _load_duplicate_candidates(
+        self, db: Session, entries: List[Dict[str, Any]]
+    ) -> Tuple[Dict[str, int], List[Tuple[int, str]]]:
+        """Batch version of detect_duplicates' lookups for a whole feed (one query per check)"""
+        try:
+            urls = {entry.get("link", "") for entry in entries}
+            existing_urls = {
+                url: article_id
+                for article_id, url in db.query(Article.id, Article.url).filter(Article.url.in_(urls)).all()
+            }
+            
+            # Trigram-similar titles for entries whose URL is new, as in detect_duplicates
+            titles = {
+                entry.get("title", "")
+                for entry in entries
+                if entry.get("link", "") not in existing_urls and entry.get("title")
+            }
+            similar_titles = self._similar_title_rows(db, titles) if titles else []
+            
+            return existing_urls, similar_titles
+            
+        except Exception as e:
+            logger.error(f"Error detecting duplicates: {str(e)}")
+            # A failed query aborts the transaction; later commits on this Session would fail too
+            db.rollback()
+            return {}, []
+    
+    def _similar_title_rows(self, db: Session, titles) -> List[Tuple[int, str]]:
+        """Active articles whose titles may match one of `titles` (candidates for the word-overlap check)"""
+        if self._use_trgm:
+            try:
+                # pg_trgm's % operator narrows candidates via the trigram index
+                return db.query(Article.id, Article.title).filter(
+                    and_(
+                        or_(*[Article.title.op("%")(title) for title in titles]),
+                        Article.is_active == True
+                    )
+                ).all()
+            except SQLAlchemyError as e:
+                db.rollback()
+                self._use_trgm = False
+                logger.warning(f"pg_trgm title lookup unavailable, falling back to ILIKE: {e}")
+        
+        return db.query(Article.id, Article.title).filter(
+            and_(
+                or_(*[Article.title.ilike(f"%{title[:50]}%") for title in titles]),
+                Article.is_active == True
+            )
+        ).all()
+    
+    def _match_duplicate(
+        self,
+        article_url: str,
+        title: str,
+        existing_urls: Dict[str, int],
+        similar_titles: List[Tuple[int, str]]
+    ) -> Optional[int]:
+        """Check one entry against candidates from _load_duplicate_candidates"""
+        duplicate_id = existing_urls.get(article_url)
+        if duplicate_id is not None or not title:
+            return duplicate_id
+        
+        for article_id, other_title in similar_titles:
+            if self._calculate_similarity(title, other_title) > 0.8:
+                return article_id
+        
+        return None
+    
     def _calculate_similarity(self, text1: str, text2: str) -> float:
         """Calculate simple text similarity (0.0 to 1.0)"""
         if not text1 or not text2:
             return 0.0
         
         # Simple word overlap similarity
-        words1 = set(text1.lower().split())
-        words2 = set(text2.lower().split())
+        words1 = _word_set(text1)
+        words2 = _word_set(text2)
         
         if not words1 or not words2:
             return 0.0
         
-        intersection = words1.intersection(words2)
-        union = words1.union(words2)
-        
-        return len(intersection) / len(union) if union else 0.0
+        intersection = len(words1 & words2)
+        return intersection / (len(words1) + len(words2) - intersection)
     
     async def fetch_and_process_source(self, db: Session, source: RSSSource) -> Dict[str, Any]:
         """Fetch and process articles from a single RSS source"""
+        # Other sources' commits expire this (shared-Session) object, and reading an expired
+        # attribute is a lazy SELECT; copy what's needed under the lock before anything else
+        info: Dict[str, Any] = {}
         try:
-            logger.info(f"Fetching RSS feed: {source.name} ({source.url})")
+            async with self._db_lock:
+                info = await asyncio.to_thread(self._source_info, source)
+            logger.info(f"Fetching RSS feed: {info['name']} ({info['url']})")
             
-            # Fetch RSS feed
-            feed_data = await self.fetch_rss_feed(source.url)
+            # Fetch RSS feed (not_modified: a 304 or the same body as last time)
+            feed_data = await self.fetch_rss_feed(
+                info["url"], info["etag"], info["last_modified"], info["last_content_hash"]
+            )
+            if feed_data["status"] == "not_modified":
+                async with self._db_lock:
+                    await asyncio.to_thread(
+                        self._save_source_articles, db, source, [],
+                        info["etag"], info["last_modified"], info["last_content_hash"]
+                    )
+                return {
+                    "source_id": info["id"],
+                    "status": "not_modified",
+                    "articles_fetched": 0,
+                    "articles_processed": 0,
+                    "duplicates_found": 0
+                }
             if feed_data["status"] != "success":
                 return {
-                    "source_id": source.id,
+                    "source_id": info["id"],
                     "status": "error",
                     "error": feed_data.get("error", "Unknown error"),
                     "articles_processed": 0
                 }
             
-            articles_processed = 0
-            articles_fetched = 0
+            articles_fetched = len(feed_data["entries"])
             duplicates_found = 0
             
-            for entry in feed_data["entries"]:
+            # Walk entries newest first and stop at the first one published well before the last fetch;
+            # feed dates are naive UTC, undated entries sort first so they are always checked.
+            # The cutoff trails the last fetch by one fetch interval, so entries that show up late
+            # with an earlier date (publishing delays, backdated posts) are still picked up
+            cutoff = info["last_fetched"]
+            if cutoff is not None:
+                if cutoff.tzinfo is not None:
+                    cutoff = cutoff.astimezone(timezone.utc).replace(tzinfo=None)
+                cutoff -= timedelta(seconds=info["fetch_frequency"] or 3600)
+            dated_entries = sorted(
+                ((self._entry_published_at(entry), entry) for entry in feed_data["entries"]),
+                key=lambda dated: dated[0] or datetime.max,
+                reverse=True
+            )
+            new_entries = []
+            for published_at, entry in dated_entries:
+                if cutoff and published_at and published_at <= cutoff:
+                    break
+                new_entries.append((published_at, entry))
+            
+            # Look up URL and title matches for every entry up front instead of per entry
+            async with self._db_lock:
+                existing_urls, similar_titles = await asyncio.to_thread(
+                    self._load_duplicate_candidates, db, [entry for _, entry in new_entries]
+                )
+            pending = []
+            rows = []
+            
+            for published_at, entry in new_entries:
                 try:
-                    articles_fetched += 1
-                    
-                    # Parse published date
-                    published_at = None
-                    if hasattr(entry, "published_parsed") and entry.published_parsed:
-                        published_at = datetime(*entry.published_parsed[:6])
-                    elif hasattr(entry, "updated_parsed") and entry.updated_parsed:
-                        published_at = datetime(*entry.updated_parsed[:6])
-                    
                     # Check if article already exists
-                    duplicate_id = await self.detect_duplicates(
-                        db, 
-                        entry.get("link", ""), 
-                        entry.get("title", ""), 
-                        entry.get("content", [])
+                    duplicate_id = self._match_duplicate(
+                        entry.get("link", ""),
+                        entry.get("title", ""),
+                        existing_urls,
+                        similar_titles
                     )
                     
                     if duplicate_id:
@@ -386,51 +680,63 @@ class RSSService:
                         "categories": entry.get("categories", []),
                         "rss_images": rss_images  # Add RSS images to article data
                     }
-                    
-                    processed = await self.process_article_content(article_data)
-                    
-                    # Create article record
-                    article = Article(
-                        title=article_data["title"],
-                        url=article_data["url"],
-                        content=processed["content"],
-                        summary=article_data["summary"],
-                        author=article_data["author"],
-                        published_at=published_at,
-                        rss_source_id=source.id,
-                        category=processed["category"],
-                        tags=processed["tags"],
-                        sentiment_score=processed["sentiment_score"],
-                        readability_score=processed["readability_score"],
-                        word_count=processed["word_count"],
-                        quality_score=processed["quality_score"],
-                        is_duplicate=duplicate_id is not None,
-                        duplicate_of=duplicate_id,
-                        # New visual and metadata fields
-                        image_url=processed["image_url"],
-                        thumbnail_url=processed["thumbnail_url"],
-                        image_alt_text=processed["image_alt_text"],
-                        reading_time=processed["reading_time"],
-                        has_images=processed["has_images"],
-                        has_videos=processed["has_videos"],
-                        has_lists=processed["has_lists"],
-                        has_quotes=processed["has_quotes"],
-                        content_type=processed["content_type"]
-                    )
-                    
-                    db.add(article)
-                    articles_processed += 1
+                    pending.append((article_data, published_at, duplicate_id))
                     
                 except Exception as e:
-                    logger.error(f"Error processing article from {source.name}: {str(e)}")
+                    logger.error(f"Error processing article from {info['name']}: {str(e)}")
                     continue
             
-            # Update source last_fetched
-            source.last_fetched = datetime.utcnow()
-            db.commit()
+            # Process the new articles concurrently so the worker pool analyzes them in parallel;
+            # two per worker keeps every worker busy while other articles wait on image fetches
+            processing_slots = asyncio.Semaphore(settings.RSS_PROCESS_CONCURRENCY or 2 * _cpu_worker_count())
+            
+            async def _bounded_process(article_data: Dict[str, Any]) -> Dict[str, Any]:
+                async with processing_slots:
+                    return await self.process_article_content(article_data)
+            
+            processed_articles = await asyncio.gather(
+                *[_bounded_process(article_data) for article_data, _, _ in pending]
+            )
+            
+            for (article_data, published_at, duplicate_id), processed in zip(pending, processed_articles):
+                # Collect the row; all of a feed's articles are inserted together below
+                rows.append({
+                    "title": article_data["title"],
+                    "url": article_data["url"],
+                    "content": processed["content"],
+                    "summary": article_data["summary"],
+                    "author": article_data["author"],
+                    "published_at": published_at,
+                    "rss_source_id": info["id"],
+                    "category": processed["category"],
+                    "tags": processed["tags"],
+                    "sentiment_score": processed["sentiment_score"],
+                    "readability_score": processed["readability_score"],
+                    "word_count": processed["word_count"],
+                    "quality_score": processed["quality_score"],
+                    "is_duplicate": duplicate_id is not None,
+                    "duplicate_of": duplicate_id,
+                    # New visual and metadata fields
+                    "image_url": processed["image_url"],
+                    "thumbnail_url": processed["thumbnail_url"],
+                    "image_alt_text": processed["image_alt_text"],
+                    "reading_time": processed["reading_time"],
+                    "has_images": processed["has_images"],
+                    "has_videos": processed["has_videos"],
+                    "has_lists": processed["has_lists"],
+                    "has_quotes": processed["has_quotes"],
+                    "content_type": processed["content_type"]
+                })
+            articles_processed = len(rows)
+            
+            async with self._db_lock:
+                await asyncio.to_thread(
+                    self._save_source_articles, db, source, rows,
+                    feed_data["etag"], feed_data["last_modified"], feed_data["content_hash"]
+                )
             
             return {
-                "source_id": source.id,
+                "source_id": info["id"],
                 "status": "success",
                 "articles_fetched": articles_fetched,
                 "articles_processed": articles_processed,
@@ -438,14 +744,74 @@ class RSSService:
             }
             
         except Exception as e:
-            logger.error(f"Error processing RSS source {source.name}: {str(e)}")
+            logger.error(f"Error processing RSS source {info.get('name')}: {str(e)}")
             return {
-                "source_id": source.id,
+                "source_id": info.get("id"),
                 "status": "error",
                 "error": str(e),
                 "articles_processed": 0
             }
     
+    @staticmethod
+    def _source_info(source: RSSSource) -> Dict[str, Any]:
+        """Plain copy of the source fields used while its feed is processed (blocking: may refresh)"""
+        return {
+            "id": source.id,
+            "name": source.name,
+            "url": source.url,
+            "etag": source.etag,
+            "last_modified": source.last_modified,
+            "last_content_hash": source.last_content_hash,
+            "last_fetched": source.last_fetched,
+            "fetch_frequency": source.fetch_frequency
+        }
+    
+    @staticmethod
+    def _entry_published_at(entry) -> Optional[datetime]:
+        """Get an entry's published (or updated) date as a naive UTC datetime"""
+        if hasattr(entry, "published_parsed") and entry.published_parsed:
+            return datetime(*entry.published_parsed[:6])
+        if hasattr(entry, "updated_parsed") and entry.updated_parsed:
+            return datetime(*entry.updated_parsed[:6])
+        return None
+    
+    def _save_source_articles(
+        self,
+        db: Session,
+        source: RSSSource,
+        rows: List[Dict[str, Any]],
+        etag: Optional[str],
+        last_modified: Optional[str],
+        content_hash: Optional[str]
+    ) -> None:
+        """Insert a feed's new articles and stamp the source as fetched (blocking)"""
+        try:
+            if rows:
+                # A feed can list the same link twice; keep its first entry
+                unique_rows: Dict[str, Dict[str, Any]] = {}
+                for row in rows:
+                    unique_rows.setdefault(row["url"], row)
+                # Single multi-row INSERT instead of one ORM object per article. Another source may
+                # have stored the same URL since the duplicate lookup, so skip conflicting rows
+                # rather than failing the whole feed
+                dialect_insert = _UPSERT_INSERTS.get(db.get_bind().dialect.name)
+                if dialect_insert is not None:
+                    stmt = dialect_insert(Article).on_conflict_do_nothing(index_elements=["url"])
+                else:
+                    stmt = insert(Article)
+                db.execute(stmt, list(unique_rows.values()))
+            
+            # Update source last_fetched and the validators for the next conditional GET
+            source.last_fetched = datetime.utcnow()
+            source.etag = etag
+            source.last_modified = last_modified
+            source.last_content_hash = content_hash
+            db.commit()
+        except SQLAlchemyError:
+            # The Session is shared by every source; leave it usable for the next one
+            db.rollback()
+            raise
+    
     async def fetch_all_sources(self, db: Session, source_ids: Optional[List[int]] = None) -> Dict[str, Any]:
         """Fetch and process all active RSS sources"""
         try:
@@ -467,8 +833,12 @@ class RSSService:
                     "errors": []
                 }
             
-            # Process sources concurrently
-            tasks = [self.fetch_and_process_source(db, source) for source in sources]
+            # Process sources concurrently, at most RSS_FETCH_CONCURRENCY at a time
+            async def _bounded(source: RSSSource) -> Dict[str, Any]:
+                async with self._fetch_sem:
+                    return await self.fetch_and_process_source(db, source)
+            
+            tasks = [_bounded(source) for source in sources]
             results = await asyncio.gather(*tasks, return_exceptions=True)
             
             # Aggregate results
@@ -580,8 +950,8 @@ class RSSService:
             else:
                 query = query.order_by(order_column.desc())
             
-            # Apply pagination
-            articles = query.offset(search_request.offset).limit(search_request.limit).all()
+            # Apply pagination; to_dict reads the source name/logo, so load sources in the same query
+            articles = query.options(joinedload(Article.rss_source)).offset(search_request.offset).limit(search_request.limit).all()
             
             return {
                 "articles": [article.to_dict() for article in articles],
@@ -603,28 +973,38 @@ class RSSService:
     async def get_rss_stats(self, db: Session) -> Dict[str, Any]:
         """Get RSS statistics"""
         try:
-            # Basic counts
-            total_sources = db.query(RSSSource).count()
-            active_sources = db.query(RSSSource).filter(RSSSource.is_active == True).count()
-            total_articles = db.query(Article).filter(Article.is_active == True).count()
-            
-            # Time-based counts
             today = datetime.utcnow().date()
             week_ago = today - timedelta(days=7)
+            quality_ranges = [
+                (0.0, 0.2, "Poor"),
+                (0.2, 0.4, "Fair"),
+                (0.4, 0.6, "Good"),
+                (0.6, 0.8, "Very Good"),
+                (0.8, 1.0, "Excellent")
+            ]
             
-            articles_today = db.query(Article).filter(
-                and_(
-                    Article.is_active == True,
-                    func.date(Article.fetched_at) == today
-                )
-            ).count()
+            # Basic counts, one conditional-aggregate query per table
+            total_sources, active_sources = db.query(
+                func.count(RSSSource.id),
+                func.count(RSSSource.id).filter(RSSSource.is_active == True)
+            ).one()
             
-            articles_this_week = db.query(Article).filter(
-                and_(
-                    Article.is_active == True,
-                    func.date(Article.fetched_at) >= week_ago
-                )
-            ).count()
+            # Article totals, time-based counts and quality distribution
+            total_articles, articles_today, articles_this_week, *quality_counts = db.query(
+                func.count(Article.id),
+                func.count(Article.id).filter(func.date(Article.fetched_at) == today),
+                func.count(Article.id).filter(func.date(Article.fetched_at) >= week_ago),
+                *[
+                    func.count(Article.id).filter(
+                        and_(Article.quality_score >= min_score, Article.quality_score < max_score)
+                    )
+                    for min_score, max_score, _ in quality_ranges
+                ]
+            ).filter(Article.is_active == True).one()
+            
+            quality_distribution = {
+                label: count for (_, _, label), count in zip(quality_ranges, quality_counts)
+            }
             
             # Top categories
             top_categories = db.query(
@@ -642,26 +1022,6 @@ class RSSService:
                 RSSSource.is_active == True
             ).order_by(desc(RSSSource.last_fetched)).limit(5).all()
             
-            # Quality distribution
-            quality_ranges = [
-                (0.0, 0.2, "Poor"),
-                (0.2, 0.4, "Fair"),
-                (0.4, 0.6, "Good"),
-                (0.6, 0.8, "Very Good"),
-                (0.8, 1.0, "Excellent")
-            ]
-            
-            quality_distribution = {}
-            for min_score, max_score, label in quality_ranges:
-                count = db.query(Article).filter(
-                    and_(
-                        Article.is_active == True,
-                        Article.quality_score >= min_score,
-                        Article.quality_score < max_score
-                    )
-                ).count()
-                quality_distribution[label] = count
-            
             return {
                 "total_sources": total_sources,
                 "active_sources": active_sources,
@@ -686,8 +1046,14 @@ class RSSService:
                 "quality_distribution": {}
             }
     
-    async def extract_images_from_content(self, content: str, article_url: str = None, rss_images: Dict[str, str] = None) -> Dict[str, str]:
-        """Extract images from RSS content, RSS fields, and article URL"""
+    async def extract_images_from_content(
+        self,
+        content: str,
+        article_url: str = None,
+        rss_images: Dict[str, str] = None,
+        soup: Optional[BeautifulSoup] = None
+    ) -> Dict[str, str]:
+        """Extract images from RSS content, RSS fields, and article URL (soup: content already parsed)"""
         logger.info(f"🔍 Starting image extraction for URL: {article_url}")
         logger.info(f"📊 RSS images provided: {rss_images}")
         logger.info(f"📝 Content length: {len(content) if content else 0}")
@@ -709,7 +1075,8 @@ class RSSService:
         
         # 2. Second priority: Extract from RSS content HTML with enhanced image detection
         if not image_data['image_url'] and content:
-            soup = BeautifulSoup(content, 'html.parser')
+            if soup is None:
+                soup = _parse_html(content, _IMAGE_TAGS)
             images = soup.find_all('img')
             
             if images:
@@ -762,7 +1129,6 @@ class RSSService:
         logger.info(f"🌐 Fetching image from article URL: {article_url}")
         try:
             import httpx
-            import re
             
             # Set a reasonable timeout
             timeout = httpx.Timeout(10.0)
@@ -771,25 +1137,25 @@ class RSSService:
                 response = await client.get(article_url, follow_redirects=True)
                 response.raise_for_status()
                 
-                # Parse HTML content
-                soup = BeautifulSoup(response.text, 'html.parser')
+                # Parse HTML content (selectolax; only attributes are read here)
+                tree = LexborHTMLParser(response.text)
                 
                 # Look for common image patterns with enhanced meta tag support
                 image_candidates = []
                 
                 # 1. Look for Open Graph images (comprehensive)
                 og_image_selectors = [
-                    {'property': 'og:image'},
-                    {'property': 'og:image:url'},
-                    {'property': 'og:image:secure_url'},
-                    {'name': 'og:image'},
-                    {'name': 'og:image:url'}
+                    'meta[property="og:image"]',
+                    'meta[property="og:image:url"]',
+                    'meta[property="og:image:secure_url"]',
+                    'meta[name="og:image"]',
+                    'meta[name="og:image:url"]'
                 ]
                 
                 for selector in og_image_selectors:
-                    og_image = soup.find('meta', selector)
-                    if og_image and og_image.get('content'):
-                        image_url = og_image['content'].strip()
+                    og_image = tree.css_first(selector)
+                    if og_image and og_image.attributes.get('content'):
+                        image_url = og_image.attributes['content'].strip()
                         if self._is_valid_image_url(image_url):
                             image_candidates.append((image_url, 1000))  # High priority for OG images
                             logger.info(f"✅ Found Open Graph image: {image_url}")
@@ -797,16 +1163,16 @@ class RSSService:
                 
                 # 2. Look for Twitter card images (comprehensive)
                 twitter_image_selectors = [
-                    {'name': 'twitter:image'},
-                    {'name': 'twitter:image:src'},
-                    {'property': 'twitter:image'},
-                    {'property': 'twitter:image:src'}
+                    'meta[name="twitter:image"]',
+                    'meta[name="twitter:image:src"]',
+                    'meta[property="twitter:image"]',
+                    'meta[property="twitter:image:src"]'
                 ]
                 
                 for selector in twitter_image_selectors:
-                    twitter_image = soup.find('meta', selector)
-                    if twitter_image and twitter_image.get('content'):
-                        image_url = twitter_image['content'].strip()
+                    twitter_image = tree.css_first(selector)
+                    if twitter_image and twitter_image.attributes.get('content'):
+                        image_url = twitter_image.attributes['content'].strip()
                         if self._is_valid_image_url(image_url):
                             image_candidates.append((image_url, 950))  # High priority for Twitter images
                             logger.info(f"✅ Found Twitter card image: {image_url}")
@@ -814,42 +1180,48 @@ class RSSService:
                 
                 # 3. Look for other meta image tags
                 meta_image_selectors = [
-                    {'name': 'image'},
-                    {'name': 'thumbnail'},
-                    {'property': 'image'},
-                    {'property': 'thumbnail'}
+                    'meta[name="image"]',
+                    'meta[name="thumbnail"]',
+                    'meta[property="image"]',
+                    'meta[property="thumbnail"]'
                 ]
                 
                 for selector in meta_image_selectors:
-                    meta_image = soup.find('meta', selector)
-                    if meta_image and meta_image.get('content'):
-                        image_url = meta_image['content'].strip()
+                    meta_image = tree.css_first(selector)
+                    if meta_image and meta_image.attributes.get('content'):
+                        image_url = meta_image.attributes['content'].strip()
                         if self._is_valid_image_url(image_url):
                             image_candidates.append((image_url, 800))  # Medium priority
                             logger.info(f"✅ Found meta image: {image_url}")
                             break
                 
                 # 4. Look for images in article content (with enhanced lazy loading support)
-                article_content = soup.find('article') or soup.find('main') or soup.find('div', class_=re.compile(r'content|article|post'))
+                article_content = (
+                    tree.css_first('article')
+                    or tree.css_first('main')
+                    or tree.css_first('div[class*="content"], div[class*="article"], div[class*="post"]')
+                )
                 if article_content:
-                    images = article_content.find_all('img')
+                    images = article_content.css('img')
                     for img in images:
-                        # Use enhanced image extraction
-                        image_url = self._extract_image_url_from_img_tag(img, article_url)
+                        # Use enhanced image extraction (the helpers only need .get on the attributes)
+                        attrs = img.attributes
+                        image_url = self._extract_image_url_from_img_tag(attrs, article_url)
                         if image_url and self._is_valid_image_url(image_url):
                             # Calculate priority score
-                            score = self._calculate_image_priority(img, image_url)
+                            score = self._calculate_image_priority(attrs, image_url)
                             image_candidates.append((image_url, score))
                             logger.info(f"✅ Found article content image: {image_url} (score: {score})")
                 
                 # 5. Look for any large images on the page (fallback)
-                all_images = soup.find_all('img')
+                all_images = tree.css('img')
                 for img in all_images:
                     # Use enhanced image extraction
-                    image_url = self._extract_image_url_from_img_tag(img, article_url)
+                    attrs = img.attributes
+                    image_url = self._extract_image_url_from_img_tag(attrs, article_url)
                     if image_url and self._is_valid_image_url(image_url):
                         # Calculate priority score
-                        score = self._calculate_image_priority(img, image_url)
+                        score = self._calculate_image_priority(attrs, image_url)
                         if score > 0:  # Only consider images with positive scores
                             image_candidates.append((image_url, score))
                             logger.info(f"✅ Found fallback image: {image_url} (score: {score})")
@@ -978,7 +1350,7 @@ class RSSService:
                 pass
         
         # Class-based scoring (prefer main content images)
-        class_attr = img_tag.get('class', [])
+        class_attr = img_tag.get('class') or []
         if isinstance(class_attr, list):
             class_attr = ' '.join(class_attr)
         
@@ -1139,7 +1511,6 @@ class RSSService:
             # 6. Check content:encoded / content HTML for <img> when RSS lacks media fields
             if (not rss_images['image_url']) and 'content' in entry:
                 try:
-                    from bs4 import BeautifulSoup
                     from urllib.parse import urljoin
                     base_url = entry.get('link') or ''
                     contents = entry.get('content') or []
@@ -1153,9 +1524,9 @@ class RSSService:
                         elif isinstance(c, str):
                             html_parts.append(c)
                     if html_parts:
-                        soup = BeautifulSoup(' '.join(html_parts), 'html.parser')
-                        img = soup.find('img')
+                        img = LexborHTMLParser(' '.join(html_parts)).css_first('img')
                         if img:
+                            img = img.attributes
                             # Support lazy attrs and srcset
                             src = img.get('src') or img.get('data-src') or img.get('data-original') or img.get('data-lazy') or img.get('data-thumbnail')
                             if (not src) and img.get('srcset'):
@@ -1214,16 +1585,20 @@ class RSSService:
             return 1
         
         # Remove HTML tags for accurate word count
-        soup = BeautifulSoup(content, 'html.parser')
-        text_content = soup.get_text()
+        text_content = _html_to_text(content)
         word_count = len(text_content.split())
         
         # Assume 200 words per minute average reading speed
         reading_time = max(1, word_count // 200)
         return min(reading_time, 60)  # Cap at 60 minutes
     
-    def extract_content_metadata(self, content: str) -> Dict[str, Any]:
-        """Extract additional content metadata"""
+    def extract_content_metadata(
+        self,
+        content: str,
+        soup: Optional[BeautifulSoup] = None,
+        word_count: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Extract additional content metadata (soup: content already parsed; word_count: already counted)"""
         if not content:
             return {
                 'has_images': False,
@@ -1234,7 +1609,8 @@ class RSSService:
                 'reading_time': 1
             }
         
-        soup = BeautifulSoup(content, 'html.parser')
+        if soup is None:
+            soup = _parse_html(content, _CONTENT_TAGS)
         
         # Count different content types
         has_images = len(soup.find_all('img')) > 0
@@ -1242,12 +1618,12 @@ class RSSService:
         has_lists = len(soup.find_all(['ul', 'ol'])) > 0
         has_quotes = len(soup.find_all('blockquote')) > 0
         
-        # Calculate word count
-        text_content = soup.get_text()
-        word_count = len(text_content.split())
+        # Calculate word count (from the full markup; soup may only hold the content tags)
+        if word_count is None:
+            word_count = len(_html_to_text(content).split())
         
-        # Calculate reading time
-        reading_time = self.calculate_reading_time(content)
+        # Calculate reading time from the same word count (as calculate_reading_time does)
+        reading_time = min(max(1, word_count // 200), 60)
         
         return {
             'has_images': has_images,
@@ -1258,12 +1634,13 @@ class RSSService:
             'reading_time': reading_time
         }
     
-    def detect_content_type(self, content: str, title: str) -> str:
-        """Detect the type of content based on content and title"""
+    def detect_content_type(self, content: str, title: str, soup: Optional[BeautifulSoup] = None) -> str:
+        """Detect the type of content based on content and title (soup: content already parsed)"""
         if not content:
             return "article"
         
-        soup = BeautifulSoup(content, 'html.parser')
+        if soup is None:
+            soup = _parse_html(content, _CONTENT_TAGS)
         
         # Check for video content
         if soup.find_all(['video', 'iframe']):
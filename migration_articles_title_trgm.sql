@@ -0,0 +1,8 @@
+-- Migration to index article titles for trigram similarity search
+-- Run this in your Supabase SQL editor
+
+-- Duplicate detection filters titles with the pg_trgm % operator, which can use
+-- this GIN index instead of scanning every article like ILIKE '%...%' did
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_articles_title_trgm ON articles USING gin (title gin_trgm_ops);
@@ -0,0 +1,12 @@
+-- Migration to store HTTP cache validators on RSS sources
+-- Run this in your Supabase SQL editor
+
+-- ETag / Last-Modified from the last successful fetch, sent back as
+-- If-None-Match / If-Modified-Since so unchanged feeds return 304
+ALTER TABLE rss_sources
+ADD COLUMN IF NOT EXISTS etag VARCHAR(255),
+ADD COLUMN IF NOT EXISTS last_modified VARCHAR(64);
+
+-- Digest of the last fetched feed body, for servers that send neither validator
+ALTER TABLE rss_sources
+ADD COLUMN IF NOT EXISTS last_content_hash VARCHAR(32);
@@ -0,0 +1,7 @@
+import os
+
+# Settings are read at import time; give the required fields test values before app modules load
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SUPABASE_URL", "http://localhost")
+os.environ.setdefault("SUPABASE_ANON_KEY", "test-anon-key")
+os.environ.setdefault("GROK_API_KEY", "test-grok-key")
@@ -0,0 +1,285 @@
+import asyncio
+
+import httpx
+import orjson
+import pytest
+
+from app.services import grok_service
+from app.services.grok_service import GrokService, RateLimitExceeded, TokenBucket
+
+NEWSLETTER_JSON = orjson.dumps({
+    "subject": "AI this week",
+    "topic": "AI",
+    "opening": "Hello",
+    "sections": [{"title": "Main", "content": "Body", "type": "main"}],
+    "call_to_action": "Read more",
+    "estimated_read_time": "3 minutes",
+    "tags": ["ai"]
+}).decode()
+
+
+def _sse_body(content: str) -> bytes:
+    """Chat completion stream delivering content in a few delta chunks"""
+    events = [
+        {"model": "test-model", "choices": [{"delta": {"content": content[i:i + 40]}}]}
+        for i in range(0, len(content), 40)
+    ]
+    events.append({"model": "test-model", "choices": [], "x_groq": {"usage": {"total_tokens": 42}}})
+    lines = [b"data: " + orjson.dumps(event) for event in events] + [b"data: [DONE]"]
+    return b"\n\n".join(lines) + b"\n\n"
+
+
+def _completion_body(content: str) -> dict:
+    """Unstreamed chat completion returning `content`"""
+    return {
+        "model": "test-model",
+        "choices": [{"message": {"role": "assistant", "content": content}}],
+        "usage": {"total_tokens": 42},
+    }
+
+
+def _mock_service(content: str, requests: list) -> GrokService:
+    """GrokService whose client answers every completion with `content`, streamed if requested"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        payload = orjson.loads(request.content)
+        requests.append(payload)
+        if payload.get("stream"):
+            return httpx.Response(200, content=_sse_body(content), headers={"content-type": "text/event-stream"})
+        return httpx.Response(200, json=_completion_body(content))
+
+    return GrokService(httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+
+@pytest.fixture(autouse=True)
+def _reset_module_state():
+    grok_service._inflight.clear()
+    grok_service._response_cache.clear()
+    # Disabled buckets: the tests shouldn't wait on the per-minute budgets
+    saved = grok_service._REQUEST_BUCKET, grok_service._TOKEN_BUCKET
+    grok_service._REQUEST_BUCKET = grok_service._TOKEN_BUCKET = TokenBucket(0)
+    yield
+    grok_service._REQUEST_BUCKET, grok_service._TOKEN_BUCKET = saved
+    grok_service._inflight.clear()
+    grok_service._response_cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_follower_retries_when_leader_is_cancelled():
+    service = GrokService()
+    calls = []
+    leader_started = asyncio.Event()
+
+    async def fake_generate(topic, *args):
+        calls.append(topic)
+        if len(calls) == 1:
+            leader_started.set()
+            await asyncio.Event().wait()  # hangs until the leader is cancelled
+        return {"success": True, "newsletter": {"subject": "s"}}
+
+    service._generate_newsletter = fake_generate
+    leader = asyncio.create_task(service.generate_newsletter("AI"))
+    await leader_started.wait()
+    follower = asyncio.create_task(service.generate_newsletter("AI"))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    result = await follower
+    assert result["success"] is True
+    assert len(calls) == 2
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+    assert not grok_service._inflight
+
+
+@pytest.mark.asyncio
+async def test_follower_gets_leader_error_not_cancellation():
+    service = GrokService()
+    release = asyncio.Event()
+
+    async def fake_generate(topic, *args):
+        await release.wait()
+        raise RuntimeError("boom")
+
+    service._generate_newsletter = fake_generate
+    leader = asyncio.create_task(service.generate_newsletter("AI"))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(service.generate_newsletter("AI"))
+    await asyncio.sleep(0)
+    release.set()
+
+    for task in (leader, follower):
+        with pytest.raises(RuntimeError, match="boom"):
+            await task
+    assert not grok_service._inflight
+
+
+@pytest.mark.asyncio
+async def test_parsed_result_is_cached():
+    requests = []
+    service = _mock_service(NEWSLETTER_JSON, requests)
+
+    first = await service.generate_newsletter("AI")
+    second = await service.generate_newsletter("AI")
+
+    assert first["newsletter"]["subject"] == "AI this week"
+    assert second["newsletter"] == first["newsletter"]
+    assert len(requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_fallback_result_is_not_cached():
+    requests = []
+    service = _mock_service("Sorry, I can't write that newsletter.", requests)
+
+    first = await service.generate_newsletter("AI")
+    await service.generate_newsletter("AI")
+
+    assert first["success"] is True
+    assert first["newsletter"]["subject"] == "Weekly Update: AI"
+    assert len(requests) == 2
+    assert not grok_service._response_cache
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_fails_fast_past_max_wait():
+    bucket = TokenBucket(60)  # refills one token per second
+    await bucket.acquire(60, max_wait=0)
+
+    with pytest.raises(RateLimitExceeded):
+        await bucket.acquire(30, max_wait=1)
+    # The rejected call reserved nothing
+    assert bucket.tokens < 1
+
+
+@pytest.mark.asyncio
+async def test_unused_token_budget_is_refunded():
+    grok_service._TOKEN_BUCKET = TokenBucket(12000)
+    service = _mock_service(NEWSLETTER_JSON, [])
+
+    result = await service.generate_newsletter("AI")
+
+    # The completion reports 42 tokens used, far below the prompt + max_tokens estimate
+    assert result["tokens_used"] == 42
+    assert grok_service._TOKEN_BUCKET.tokens >= 12000 - 43
+
+
+@pytest.mark.asyncio
+async def test_connect_error_is_retried_with_its_budget_refunded(monkeypatch):
+    grok_service._REQUEST_BUCKET = TokenBucket(30)
+    grok_service._TOKEN_BUCKET = TokenBucket(12000)
+    sleep = asyncio.sleep
+    monkeypatch.setattr(asyncio, "sleep", lambda delay: sleep(0))
+    attempts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        attempts.append(request)
+        if len(attempts) == 1:
+            raise httpx.ConnectError("connection refused", request=request)
+        return httpx.Response(200, json=_completion_body(NEWSLETTER_JSON))
+
+    service = GrokService(httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    result = await service.generate_newsletter("AI")
+
+    assert result["success"] is True
+    assert len(attempts) == 2
+    # Only the successful attempt is charged: one request and the 42 tokens it used
+    assert grok_service._REQUEST_BUCKET.tokens >= 30 - 1.01
+    assert grok_service._TOKEN_BUCKET.tokens >= 12000 - 43
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_call_returns_error_result(monkeypatch):
+    monkeypatch.setattr(grok_service.settings, "GROK_MAX_QUEUE_WAIT", 1.0)
+    grok_service._TOKEN_BUCKET = TokenBucket(100)
+    requests = []
+    service = _mock_service(NEWSLETTER_JSON, requests)
+
+    result = await service.generate_newsletter("AI", max_tokens=5000)
+    second = await service.generate_newsletter("ML", max_tokens=5000)
+
+    assert result["success"] is True
+    assert second == {
+        "success": False,
+        "error": "Too many newsletter requests right now. Please try again in a minute.",
+        "error_type": "rate_limited"
+    }
+    assert len(requests) == 1
+
+
+def test_json_parsing_coerces_loosely_typed_fields():
+    content = orjson.dumps({
+        "subject": None,
+        "preview_text": None,
+        "opening": "Hi",
+        "sections": [{"title": "Main", "content": "Body"}, {"content": "Untitled"}, "Plain text"],
+        "estimated_read_time": 4,
+        "tags": ["ai", None, 3]
+    }).decode()
+
+    newsletter, parsed = GrokService()._parse_newsletter_content(content, "AI")
+
+    assert parsed is True
+    assert newsletter["subject"] == "Weekly Update: AI"
+    assert newsletter["estimated_read_time"] == "4 minutes"
+    assert newsletter["call_to_action"] == "Stay tuned for more updates!"
+    assert [s["type"] for s in newsletter["sections"]] == ["main", "main", "main"]
+    assert newsletter["sections"][1]["title"] == "Main Content"
+    assert newsletter["sections"][2]["content"] == "Plain text"
+    assert newsletter["tags"] == ["ai", "3"]
+
+
+def test_undecodable_json_falls_back():
+    newsletter, parsed = GrokService()._parse_newsletter_content("{ this isn't JSON", "AI")
+
+    assert parsed is False
+    assert newsletter["subject"] == "Weekly Update: AI"
+
+
+@pytest.mark.asyncio
+async def test_json_mode_is_requested_unstreamed():
+    requests = []
+    service = _mock_service(NEWSLETTER_JSON, requests)
+    payload = service._build_payload("prompt", 100)
+
+    content, model_used, usage = await service._request_completion(payload, 200)
+
+    assert requests[0]["stream"] is False
+    assert requests[0]["response_format"] == {"type": "json_object"}
+    assert orjson.loads(content) == orjson.loads(NEWSLETTER_JSON)
+    assert model_used == "test-model"
+    assert usage == {"total_tokens": 42}
+
+
+@pytest.mark.asyncio
+async def test_streamed_body_is_reassembled(monkeypatch):
+    monkeypatch.setattr(GrokService, "_STATIC_PARAMS", {"temperature": 0.7, "top_p": 0.9, "stream": True})
+    requests = []
+    service = _mock_service(NEWSLETTER_JSON, requests)
+    payload = service._build_payload("prompt", 100)
+
+    content, model_used, usage = await service._request_completion(payload, 200)
+
+    assert requests[0]["stream"] is True
+    assert "response_format" not in requests[0]
+    assert orjson.loads(content) == orjson.loads(NEWSLETTER_JSON)
+    assert model_used == "test-model"
+    assert usage == {"total_tokens": 42}
+
+
+@pytest.mark.asyncio
+async def test_json_validation_failure_builds_the_fallback():
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(400, json={"error": {
+            "message": "Failed to generate JSON. Please adjust your prompt.",
+            "type": "invalid_request_error",
+            "code": "json_validate_failed",
+            "failed_generation": "Sorry, I can't write that newsletter.",
+        }})
+
+    service = GrokService(httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    result = await service.generate_newsletter("AI")
+
+    assert result["success"] is True
+    assert result["raw_content"] == "Sorry, I can't write that newsletter."
+    assert result["newsletter"]["subject"]
+    assert not grok_service._response_cache
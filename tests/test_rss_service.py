@@ -0,0 +1,313 @@
+import asyncio
+import os
+import sqlite3
+import threading
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+import feedparser
+import httpx
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.models.newsletter  # noqa: F401  (articles.newsletter_id references this table)
+import app.models.user  # noqa: F401
+import app.models.user_preferences  # noqa: F401
+from app.core.database import Base
+from app.models.article import Article
+from app.models.rss_source import RSSSource
+from app.services import rss_service
+from app.services.rss_service import RSSService
+
+
+def _feed(*items):
+    """Parsed RSS feed with one entry per (title, link[, pubDate]) tuple"""
+    xml = "<rss><channel><title>Feed</title>" + "".join(
+        f"<item><title>{title}</title><link>{link}</link>"
+        f"<pubDate>{date[0] if date else 'Mon, 01 Jan 2024 12:00:00 GMT'}</pubDate></item>"
+        for title, link, *date in items
+    ) + "</channel></rss>"
+    return feedparser.parse(xml).entries
+
+
+async def _processed(article_data):
+    """Stand-in for process_article_content (textstat needs the cmudict corpus)"""
+    return {
+        "content": f"Body of {article_data['title']}",
+        "word_count": 3,
+        "readability_score": 50.0,
+        "sentiment_score": 0.0,
+        "quality_score": 0.5,
+        "tags": [],
+        "category": "technology",
+        "image_url": None,
+        "thumbnail_url": None,
+        "image_alt_text": None,
+        "reading_time": 1,
+        "has_images": False,
+        "has_videos": False,
+        "has_lists": False,
+        "has_quotes": False,
+        "content_type": "article"
+    }
+
+
+@pytest.fixture
+def db():
+    # One shared connection: the service runs its queries in worker threads
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine, tables=[RSSSource.__table__, Article.__table__])
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _service(feeds):
+    """RSSService whose fetch_rss_feed returns feeds[url] instead of going to the network"""
+    service = RSSService()
+
+    async def fetch_rss_feed(url, etag=None, last_modified=None, content_hash=None):
+        await asyncio.sleep(0)
+        return {
+            "status": "success",
+            "entries": feeds[url],
+            "etag": f"etag-{url}",
+            "last_modified": None,
+            "content_hash": f"hash-{url}"
+        }
+
+    service.fetch_rss_feed = fetch_rss_feed
+    service.process_article_content = _processed
+    return service
+
+
+@pytest.mark.asyncio
+async def test_sources_sharing_a_session_stay_off_the_event_loop(db):
+    db.add_all([
+        RSSSource(id=1, name="One", url="https://one.example/feed", is_active=True),
+        RSSSource(id=2, name="Two", url="https://two.example/feed", is_active=True),
+    ])
+    db.commit()
+    sources = db.query(RSSSource).order_by(RSSSource.id).all()
+    service = _service({
+        "https://one.example/feed": _feed(("A", "https://one.example/a"), ("B", "https://one.example/b")),
+        "https://two.example/feed": _feed(("C", "https://two.example/c")),
+    })
+    # Each source's commit expires the other's attributes; reloading them must not happen on the loop
+    loop_thread = threading.current_thread()
+    statements_on_loop = []
+    event.listen(
+        db.get_bind(), "before_cursor_execute",
+        lambda conn, cursor, statement, *args: threading.current_thread() is loop_thread
+        and statements_on_loop.append(statement)
+    )
+
+    results = await asyncio.gather(*(service.fetch_and_process_source(db, source) for source in sources))
+
+    assert [r["status"] for r in results] == ["success", "success"]
+    assert [r["source_id"] for r in results] == [1, 2]
+    assert statements_on_loop == []
+    assert db.query(Article).count() == 3
+    for source in db.query(RSSSource).all():
+        assert source.last_fetched is not None
+        assert source.last_content_hash == f"hash-{source.url}"
+    await service.close()
+
+
+@pytest.mark.asyncio
+async def test_title_dedupe_without_pg_trgm_falls_back_to_ilike(db):
+    db.add(RSSSource(id=1, name="One", url="https://one.example/feed", is_active=True))
+    db.add(Article(id=10, title="OpenAI ships a new model", url="https://elsewhere.example/x",
+                   rss_source_id=1, is_active=True))
+    db.commit()
+
+    def no_trgm(conn, cursor, statement, *args):
+        # SQLite reads % as modulo; emulate PostgreSQL without the pg_trgm extension
+        if " % " in statement:
+            raise sqlite3.OperationalError("operator does not exist: character varying % unknown")
+
+    event.listen(db.get_bind(), "before_cursor_execute", no_trgm)
+    service = _service({"https://one.example/feed": _feed(
+        ("OpenAI ships a new model", "https://one.example/copy"),
+        ("Something else entirely", "https://one.example/new"),
+    )})
+
+    result = await service.fetch_and_process_source(db, db.get(RSSSource, 1))
+
+    assert result["status"] == "success"
+    assert result["duplicates_found"] == 1
+    assert result["articles_processed"] == 1
+    assert db.get(RSSSource, 1).last_fetched is not None
+    await service.close()
+
+
+@pytest.mark.asyncio
+async def test_broken_cpu_pool_is_replaced(monkeypatch):
+    monkeypatch.setattr(rss_service.settings, "RSS_PROCESS_WORKERS", 1)
+    rss_service.shutdown_cpu_pool()
+    try:
+        # The worker exits mid-task, which breaks the pool (the one retry dies the same way)
+        with pytest.raises(BrokenProcessPool):
+            await rss_service._run_in_cpu_pool(os._exit, 1)
+
+        assert await rss_service._run_in_cpu_pool(abs, -3) == 3
+        assert await rss_service._run_in_cpu_pool(abs, -4) == 4
+    finally:
+        rss_service.shutdown_cpu_pool()
+
+
+@pytest.mark.asyncio
+async def test_readability_is_cached_in_the_parent_process(monkeypatch):
+    scored = []
+
+    async def run_inline(func, *args):
+        return func(*args)
+
+    def fake_flesch(text):
+        scored.append(text)
+        return 61.0
+
+    monkeypatch.setattr(rss_service, "_run_in_cpu_pool", run_inline)
+    monkeypatch.setattr(rss_service.textstat, "flesch_reading_ease", fake_flesch)
+    rss_service._READABILITY_CACHE.clear()
+    service = RSSService()
+    article = {"title": "T", "url": "", "content": [], "summary": "<p>Some article text here.</p>"}
+
+    first = await service.process_article_content(dict(article))
+    second = await service.process_article_content(dict(article))
+
+    assert first["readability_score"] == second["readability_score"] == 61.0
+    assert len(scored) == 1
+    await service.close()
+
+
+@pytest.mark.asyncio
+async def test_feed_with_an_existing_url_is_deduplicated_in_one_lookup(db):
+    db.add(RSSSource(id=1, name="One", url="https://one.example/feed", is_active=True))
+    db.add(Article(id=10, title="Already stored", url="https://one.example/old", rss_source_id=1, is_active=True))
+    db.commit()
+    service = _service({"https://one.example/feed": _feed(
+        ("Already stored (updated title)", "https://one.example/old"),
+        ("Brand new story", "https://one.example/new"),
+        ("Another new story", "https://one.example/newer"),
+    )})
+    lookups = []
+    event.listen(
+        db.get_bind(), "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statement.lstrip().startswith("SELECT")
+        and "FROM articles" in statement and lookups.append(statement)
+    )
+
+    result = await service.fetch_and_process_source(db, db.get(RSSSource, 1))
+
+    assert result["duplicates_found"] == 1
+    assert result["articles_processed"] == 2
+    # One URL query for the whole feed plus one title-candidate query, not one per entry
+    assert len(lookups) == 2
+    urls = sorted(url for (url,) in db.query(Article.url).all())
+    assert urls == ["https://one.example/new", "https://one.example/newer", "https://one.example/old"]
+    await service.close()
+
+
+@pytest.mark.asyncio
+async def test_new_articles_are_bulk_inserted(db):
+    db.add(RSSSource(id=1, name="One", url="https://one.example/feed", is_active=True))
+    db.commit()
+    service = _service({"https://one.example/feed": _feed(
+        ("First", "https://one.example/1"),
+        ("Second", "https://one.example/2"),
+        ("Third", "https://one.example/3"),
+    )})
+    inserts = []
+    event.listen(
+        db.get_bind(), "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statement.lstrip().startswith("INSERT INTO articles")
+        and inserts.append(statement)
+    )
+
+    result = await service.fetch_and_process_source(db, db.get(RSSSource, 1))
+
+    assert result["articles_processed"] == 3
+    assert len(inserts) == 1
+    stored = db.query(Article).order_by(Article.url).all()
+    assert [a.title for a in stored] == ["First", "Second", "Third"]
+    assert all(a.rss_source_id == 1 and a.category == "technology" for a in stored)
+    assert stored[0].content == "Body of First"
+    assert stored[0].published_at is not None
+    await service.close()
+
+
+@pytest.mark.asyncio
+async def test_url_conflict_between_sources_does_not_drop_other_articles(db):
+    db.add_all([
+        RSSSource(id=i, name=f"Source {i}", url=f"https://{i}.example/feed", is_active=True)
+        for i in (1, 2, 3)
+    ])
+    db.commit()
+    sources = db.query(RSSSource).order_by(RSSSource.id).all()
+    shared = "https://news.example/shared"
+    service = _service({
+        "https://1.example/feed": _feed(("Shared story", shared), ("Shared story (updated)", shared)),
+        "https://2.example/feed": _feed(("Syndicated copy", shared), ("Two only", "https://2.example/own")),
+        "https://3.example/feed": _feed(("Three only", "https://3.example/own")),
+    })
+
+    results = await asyncio.gather(*(service.fetch_and_process_source(db, source) for source in sources))
+
+    assert [r["status"] for r in results] == ["success", "success", "success"]
+    stored = {a.url: a for a in db.query(Article).all()}
+    assert set(stored) == {shared, "https://2.example/own", "https://3.example/own"}
+    assert stored[shared].title == "Shared story"
+    assert all(source.last_fetched is not None for source in db.query(RSSSource).all())
+    await service.close()
+
+
+@pytest.mark.asyncio
+async def test_late_backdated_entry_is_not_cut_off(db):
+    # Fetched at 12:30; the 12:00 entry only appeared in the feed afterwards
+    db.add(RSSSource(
+        id=1, name="One", url="https://one.example/feed", is_active=True,
+        fetch_frequency=3600, last_fetched=datetime(2024, 1, 1, 12, 30)
+    ))
+    db.commit()
+    source = db.get(RSSSource, 1)
+    service = _service({"https://one.example/feed": _feed(
+        ("Late", "https://one.example/late"),
+        ("Old", "https://one.example/old", "Mon, 25 Dec 2023 12:00:00 GMT"),
+    )})
+
+    result = await service.fetch_and_process_source(db, source)
+
+    assert result["status"] == "success"
+    assert result["articles_processed"] == 1
+    assert [a.url for a in db.query(Article).all()] == ["https://one.example/late"]
+    await service.close()
+
+
+@pytest.mark.asyncio
+async def test_feed_markup_is_sanitized():
+    xml = (
+        "<rss><channel><title>Feed</title><item>"
+        "<title>Hello &lt;img src=x onerror=alert(1)&gt;&lt;script&gt;alert(2)&lt;/script&gt;world</title>"
+        "<author>&lt;b onclick=steal()&gt;Ada&lt;/b&gt;</author>"
+        "<description>&lt;p onclick=steal()&gt;Summary&lt;/p&gt;&lt;script&gt;alert(3)&lt;/script&gt;</description>"
+        "<link>https://one.example/a</link>"
+        "</item></channel></rss>"
+    )
+    service = RSSService()
+    await service.session.aclose()
+    service.session = httpx.AsyncClient(
+        transport=httpx.MockTransport(lambda request: httpx.Response(200, text=xml))
+    )
+
+    feed = await service.fetch_rss_feed("https://one.example/feed")
+
+    entry = feed["entries"][0]
+    assert entry.title == "Hello world"
+    assert entry.author == "Ada"
+    assert "script" not in entry.summary and "onclick" not in entry.summary
+    assert "Summary" in entry.summary
+    await service.close()